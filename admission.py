@@ -0,0 +1,80 @@
+import math
+import logging
+import redis
+from config import Config
+
+logger = logging.getLogger(__name__) # Will inherit config from the script that imports this
+
+RATE_LIMIT_WINDOW = 60 # Seconds; per-IP / per-phone limits are expressed per minute
+
+def check_rate_limit(redis_conn, scope, identifier, limit):
+    """
+    Counts one request for `identifier` in the current one-minute window.
+    Returns 0 if the request is allowed, otherwise the number of seconds
+    until the window resets (suitable for a Retry-After header).
+    """
+    key = f"{Config.REDIS_WHATSAPP_QUEUE}:limit:{scope}:{identifier}"
+    pipe = redis_conn.pipeline()
+    pipe.incr(key)
+    pipe.ttl(key)
+    count, ttl = pipe.execute()
+    if ttl < 0: # First request in this window (or expiry was lost), start the clock
+        redis_conn.expire(key, RATE_LIMIT_WINDOW)
+        ttl = RATE_LIMIT_WINDOW
+    if count > limit:
+        return max(ttl, 1)
+    return 0
+
+def get_drain_rate(redis_conn):
+    """
+    Returns the worker's drain rate in messages per minute, as published by
+    queue_processor.py. Falls back to Config.RATE_LIMIT when nothing has
+    been published recently (e.g. worker just started or is idle).
+    """
+    try:
+        value = redis_conn.get(Config.REDIS_DRAIN_RATE_KEY)
+        if value is not None and float(value) > 0:
+            return min(float(value), Config.RATE_LIMIT)
+    except (ValueError, redis.exceptions.RedisError) as e:
+        logger.warning(f"Could not read drain rate, using RATE_LIMIT: {e}")
+    return float(Config.RATE_LIMIT)
+
+def queue_capacity(drain_rate):
+    """Maximum queue length the worker can clear within MAX_QUEUE_DELAY_MINUTES."""
+    return max(1, int(drain_rate * Config.MAX_QUEUE_DELAY_MINUTES))
+
+def seconds_to_drain(message_count, drain_rate):
+    """Estimated seconds for the worker to send `message_count` messages."""
+    return math.ceil(message_count / drain_rate * 60)
+
+class DrainRateTracker:
+    """
+    Measures how fast the worker actually sends messages and publishes it to
+    Redis for app.py's admission control. Only time spent sending (including
+    rate-limit sleeps) is measured, so idle periods do not drag the rate down.
+    """
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.seconds_per_message = None
+
+    def record(self, duration):
+        if self.seconds_per_message is None:
+            self.seconds_per_message = duration
+        else:
+            self.seconds_per_message += self.smoothing * (duration - self.seconds_per_message)
+
+    @property
+    def rate(self):
+        if not self.seconds_per_message:
+            return None
+        return min(60.0 / self.seconds_per_message, Config.RATE_LIMIT)
+
+    def publish(self, redis_conn):
+        rate = self.rate
+        if rate is None:
+            return
+        try:
+            redis_conn.set(Config.REDIS_DRAIN_RATE_KEY, f"{rate:.3f}", ex=Config.DRAIN_RATE_TTL)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Could not publish drain rate: {e}")
+
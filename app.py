@@ -1,29 +1,40 @@
 from flask import Flask, request, jsonify, render_template
 import redis
-from config import Config
+from config import Config, warn_insecure_defaults
+import admission
+import idempotency
+from logging_setup import configure_logging, set_correlation_id
+from redis_pool import get_redis
 import re
 import logging
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Configure basic logging
-logging.basicConfig(level=app.config['LOG_LEVEL'],
-                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-try:
-    r = redis.Redis(
-        host=Config.REDIS_HOST,
-        port=Config.REDIS_PORT,
-        password=Config.REDIS_PASSWORD, # [cite: 3]
-        decode_responses=True
-    )
-    r.ping()
-    logger.info("Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    logger.error(f"Could not connect to Redis: {e}")
-    r = None # Set to None if connection fails
+def check_redis():
+    """Logs whether Redis is reachable at startup. Requests still retry the connection if it is not."""
+    try:
+        get_redis().ping()
+        logger.info("Successfully connected to Redis.")
+        return True
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Could not connect to Redis: {e}")
+        return False
+
+def too_many_requests(error, retry_after):
+    response = jsonify({"success": False, "error": error, "retry_after": retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def duplicate_response(user_phone):
+    logger.info("Duplicate message from %s ignored.", user_phone)
+    return jsonify({
+        "success": True,
+        "duplicate": True,
+        "message": "Message was already queued for delivery to business."
+    })
 
 @app.route('/')
 def index():
@@ -33,10 +44,7 @@ def index():
 
 @app.route('/send', methods=['POST'])
 def handle_send_message(): # Renamed for clarity
-    if not r:
-        logger.error("Redis connection not available.")
-        return jsonify({"success": False, "error": "Server error: Could not connect to message queue"}), 500
-        
+    r = get_redis() # Shared pool, connects on first use
     try:
         data = request.json
         user_phone_widget = data.get('user_phone', '').strip() # Website user's phone number
@@ -57,17 +65,49 @@ def handle_send_message(): # Renamed for clarity
         # Message format: Identify the sender (website user)
         # You might want to include more details if captured from the widget (e.g., name, email)
         formatted_message_to_business = f"New query from website visitor ({user_phone_widget}):\n\n{message_widget}"
+        set_correlation_id(idempotency.content_hash(recipient_business_whatsapp, formatted_message_to_business)[:12])
+
+        # Drop double-clicks and client retries before they use up a rate-limit slot
+        web_key = idempotency.client_key("web", request.headers.get('Idempotency-Key'), scope=user_phone_widget)
+        dedup_keys = idempotency.message_keys(recipient_business_whatsapp, formatted_message_to_business, web_key)
+        if idempotency.is_duplicate(r, dedup_keys):
+            return duplicate_response(user_phone_widget)
 
-        # Queue message for sending to the business
+        # Admission control: per-client and per-sender limits, then a queue-length cap
+        client_ip = request.remote_addr or "unknown"
+        retry_after = admission.check_rate_limit(r, "ip", client_ip, Config.SEND_LIMIT_PER_IP)
+        if not retry_after:
+            retry_after = admission.check_rate_limit(r, "phone", user_phone_widget, Config.SEND_LIMIT_PER_PHONE)
+        if retry_after:
+            logger.warning(f"Rate limit exceeded for {client_ip} / {user_phone_widget}")
+            return too_many_requests("Too many messages. Please try again later.", retry_after)
+
+        drain_rate = admission.get_drain_rate(r)
+        capacity = admission.queue_capacity(drain_rate)
+        queue_length = r.llen(Config.REDIS_WHATSAPP_QUEUE)
+        if queue_length >= capacity:
+            logger.warning(f"Queue full ({queue_length}/{capacity} at {drain_rate:.2f} msg/min). Rejecting message.")
+            retry_after = admission.seconds_to_drain(queue_length - capacity + 1, drain_rate)
+            return too_many_requests("Message queue is full. Please try again later.", retry_after)
+
+        # Queue message for sending to the business; dedup keys are claimed in the same atomic step
         payload = f"{recipient_business_whatsapp}||{formatted_message_to_business}"
-        r.rpush(Config.REDIS_WHATSAPP_QUEUE, payload)
-        logger.info(f"Queued message for {recipient_business_whatsapp} from {user_phone_widget}")
+        queue_length = idempotency.enqueue_once(r, Config.REDIS_WHATSAPP_QUEUE, payload, dedup_keys)
+        if queue_length is None: # An identical request was queued since the check above
+            return duplicate_response(user_phone_widget)
+
+        logger.info("Queued message for %s from %s", recipient_business_whatsapp, user_phone_widget)
         
         return jsonify({
             "success": True,
-            "message": "Message successfully queued for delivery to business."
+            "message": "Message successfully queued for delivery to business.",
+            "estimated_delivery_seconds": admission.seconds_to_drain(queue_length, drain_rate)
         })
     
+    except redis.exceptions.ConnectionError as e:
+        logger.error(f"Redis connection not available: {e}")
+        return jsonify({"success": False, "error": "Server error: Could not connect to message queue"}), 500
+
     except Exception as e:
         logger.error(f"Error in /send endpoint: {e}", exc_info=True)
         return jsonify({
@@ -78,4 +118,7 @@ def handle_send_message(): # Renamed for clarity
 if __name__ == '__main__':
     # Note: Flask-SocketIO is not used in this simplified concept for app.py
     # If you need real-time updates to the widget *from this server*, you'd re-add it.
-    app.run(host='0.0.0.0', port=5000, debug=False) # Set debug=False for production
\ No newline at end of file
+    configure_logging('app')
+    warn_insecure_defaults(logger)
+    check_redis()
+    app.run(host=Config.FLASK_HOST, port=Config.FLASK_PORT, debug=False) # Set debug=False for production
\ No newline at end of file
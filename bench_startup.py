@@ -0,0 +1,76 @@
+"""
+Cold-start benchmark: import time and memory for each entry point.
+
+Each target is imported in a fresh interpreter (median of --runs) and the
+report shows import time, peak RSS, and whether Selenium or Flask got loaded
+and whether a Redis connection was opened during import.
+
+    python3 bench_startup.py
+    python3 bench_startup.py --runs 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+TARGETS = [
+    ("interpreter only", []),
+    ("app.py", ["app"]),
+    ("email_processor.py", ["email_processor"]),
+    ("queue_processor.py", ["queue_processor"]),
+    ("bridge.py --components app,email", ["bridge", "app", "email_processor"]),
+    ("bridge.py (all components)", ["bridge", "app", "email_processor", "queue_processor"]),
+    ("queue worker with sender", ["queue_processor", "whatsapp_sender"]),
+]
+
+# Runs in the child interpreter; socket.socket is wrapped to count connections opened during import
+PROBE = """
+import json, resource, socket, sys, time
+connections = []
+class CountingSocket(socket.socket):
+    def connect(self, address):
+        connections.append(address)
+        return super().connect(address)
+socket.socket = CountingSocket
+started = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "selenium": "selenium" in sys.modules,
+    "flask": "flask" in sys.modules,
+    "connections": len(connections),
+}}))
+"""
+
+def measure(modules):
+    result = subprocess.run([sys.executable, "-c", PROBE.format(modules=modules)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and memory")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target")
+    args = parser.parse_args(argv)
+
+    print(f"{'Target':<36} {'Import ms':>10} {'Peak RSS MB':>12} {'Selenium':>9} {'Flask':>6} {'Conns':>6}")
+    for label, modules in TARGETS:
+        try:
+            samples = [measure(modules) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{label:<36} unavailable: {e}")
+            continue
+        print(f"{label:<36} "
+              f"{statistics.median(s['import_ms'] for s in samples):>10.1f} "
+              f"{statistics.median(s['rss_mb'] for s in samples):>12.1f} "
+              f"{'yes' if samples[0]['selenium'] else 'no':>9} "
+              f"{'yes' if samples[0]['flask'] else 'no':>6} "
+              f"{samples[0]['connections']:>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Unified runtime: runs any subset of the bridge components in one process.
+
+    python3 bridge.py                              # components from BRIDGE_COMPONENTS (default: all)
+    python3 bridge.py --components app,email       # Selenium/Chrome is never loaded
+
+Components run in threads (Flask's WSGI server, Selenium and imaplib are all
+blocking) and share one Redis connection pool. A component's module is only
+imported when it is selected. /livez and /readyz are served on HEALTH_PORT.
+"""
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import redis
+from config import Config, warn_insecure_defaults
+from logging_setup import configure_logging
+from redis_pool import get_redis
+
+logger = logging.getLogger(__name__)
+
+class Component:
+    """A runnable part of the bridge: `run` blocks until `stop` is called."""
+    def __init__(self, name, run, stop, ready=None):
+        self.name = name
+        self.run = run
+        self.stop = stop
+        self.ready = ready or (lambda: True)
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.run()
+        except Exception as e:
+            logger.error(f"Component '{self.name}' crashed: {e}", exc_info=True)
+        logger.info(f"Component '{self.name}' stopped.")
+
+    def is_alive(self):
+        return bool(self.thread and self.thread.is_alive())
+
+def load_app(stop_event):
+    from werkzeug.serving import make_server
+    import app as web
+    web.check_redis()
+    server = make_server(Config.FLASK_HOST, Config.FLASK_PORT, web.app, threaded=True)
+    logger.info(f"Web server listening on {Config.FLASK_HOST}:{Config.FLASK_PORT}")
+    return Component("app", server.serve_forever, server.shutdown)
+
+def load_queue(stop_event):
+    import queue_processor
+    # Clear before any component starts, so no message is accepted and then wiped
+    if Config.CLEAR_QUEUE_ON_STARTUP:
+        queue_processor.clear_queue(queue_processor.RedisManager())
+
+    def stop():
+        queue_processor.shutdown_flag = True
+    return Component("queue", lambda: queue_processor.run_worker(clear_on_startup=False), stop,
+                     ready=queue_processor.is_ready)
+
+def load_email(stop_event):
+    import email_processor
+    return Component("email", lambda: email_processor.process_emails(should_stop=stop_event.is_set),
+                     stop_event.set)
+
+COMPONENT_LOADERS = {
+    "app": load_app,
+    "queue": load_queue,
+    "email": load_email,
+}
+
+def redis_available():
+    try:
+        return get_redis().ping()
+    except redis.exceptions.RedisError:
+        return False
+
+def make_health_server(components):
+    """HTTP server for liveness (all component threads running) and readiness (plus Redis and component checks)."""
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/livez':
+                status = {c.name: c.is_alive() for c in components}
+                healthy = all(status.values())
+            elif self.path == '/readyz':
+                status = {c.name: c.is_alive() and c.ready() for c in components}
+                status["redis"] = redis_available()
+                healthy = all(status.values())
+            else:
+                self.send_error(404)
+                return
+            body = json.dumps({"status": "ok" if healthy else "unavailable", "checks": status}).encode()
+            self.send_response(200 if healthy else 503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("Health check: " + format, *args)
+
+    return ThreadingHTTPServer((Config.FLASK_HOST, Config.HEALTH_PORT), HealthHandler)
+
+def parse_components(value):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in COMPONENT_LOADERS]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"Unknown component(s) {', '.join(unknown) or '(none)'}; choose from {', '.join(COMPONENT_LOADERS)}"
+        )
+    return names
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run WhatsApp bridge components in one process")
+    parser.add_argument("--components", type=parse_components, default=Config.BRIDGE_COMPONENTS,
+                        help=f"Comma-separated subset of: {', '.join(COMPONENT_LOADERS)}")
+    parser.add_argument("--shutdown-timeout", type=float, default=45,
+                        help="Seconds to wait for each component to stop")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    configure_logging('bridge', log_file=Config.LOG_FILE)
+    if "app" in args.components:
+        warn_insecure_defaults(logger)
+    logger.info(f"Starting bridge components: {', '.join(args.components)}")
+
+    stop_event = threading.Event()
+
+    def handle_signal(sig, frame):
+        logger.info(f"Shutdown signal {sig} received. Initiating graceful shutdown.")
+        stop_event.set()
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    components = [COMPONENT_LOADERS[name](stop_event) for name in args.components]
+    for component in components:
+        component.start()
+
+    health_server = make_health_server(components)
+    threading.Thread(target=health_server.serve_forever, name="health", daemon=True).start()
+    logger.info(f"Health checks on port {Config.HEALTH_PORT} (/livez, /readyz)")
+
+    # A crashed component takes the whole bridge down, so the process manager (e.g. PM2)
+    # restarts it just as it would have restarted the separate worker process
+    exit_code = 0
+    while not stop_event.wait(1):
+        dead = [component.name for component in components if not component.is_alive()]
+        if dead:
+            logger.error(f"Component(s) {', '.join(dead)} stopped unexpectedly. Shutting down the bridge.")
+            exit_code = 1
+            stop_event.set()
+
+    for component in components:
+        component.stop()
+    for component in components:
+        component.thread.join(timeout=args.shutdown_timeout)
+        if component.is_alive():
+            logger.warning(f"Component '{component.name}' did not stop within {args.shutdown_timeout}s.")
+    health_server.shutdown()
+    logger.info("Bridge stopped.")
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -31,14 +31,46 @@ class Config:
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379)) # [cite: 3]
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None) # [cite: 3]
     REDIS_WHATSAPP_QUEUE = "whatsapp_queue" # Name of the Redis queue
+    # Development only: empty the queue when the worker starts (pending messages are lost)
+    CLEAR_QUEUE_ON_STARTUP = os.getenv("CLEAR_QUEUE_ON_STARTUP", "false").lower() == "true"
+    # Key where queue_processor.py publishes its measured drain rate (messages per minute)
+    REDIS_DRAIN_RATE_KEY = "whatsapp_queue:drain_rate"
+    DRAIN_RATE_TTL = int(os.getenv("DRAIN_RATE_TTL", 300)) # Seconds before a stale drain rate is ignored
+    # Prefix for duplicate-suppression keys (Idempotency-Key headers and message content hashes)
+    REDIS_DEDUP_PREFIX = "whatsapp_queue:dedup"
+    DEDUP_WINDOW_SECONDS = int(os.getenv("DEDUP_WINDOW_SECONDS", 600)) # Identical messages within this window are dropped
+
+    # --- Admission Control (for the /send endpoint) ---
+    # Maximum number of messages accepted per client IP / per sender phone per minute
+    SEND_LIMIT_PER_IP = int(os.getenv("SEND_LIMIT_PER_IP", 10))
+    SEND_LIMIT_PER_PHONE = int(os.getenv("SEND_LIMIT_PER_PHONE", 3))
+    # The queue is capped at however many messages the worker can drain in this many minutes
+    MAX_QUEUE_DELAY_MINUTES = int(os.getenv("MAX_QUEUE_DELAY_MINUTES", 30))
 
     # --- Flask Configuration ---
     SECRET_KEY = os.getenv("FLASK_SECRET", "your_insecure_development_secret_key") # [cite: 3]
-    if SECRET_KEY == "your_insecure_development_secret_key":
-        print("WARNING: Using default insecure FLASK_SECRET. Set FLASK_SECRET in production!") # [cite: 3, 4]
+    FLASK_HOST = os.getenv("FLASK_HOST", "0.0.0.0")
+    FLASK_PORT = int(os.getenv("FLASK_PORT", 5000))
+
+    # --- Unified Runtime (bridge.py) ---
+    # Components to run in one process: any of "app", "queue", "email"
+    BRIDGE_COMPONENTS = os.getenv("BRIDGE_COMPONENTS", "app,queue,email")
+    HEALTH_PORT = int(os.getenv("HEALTH_PORT", 8081)) # Serves /livez and /readyz
 
     # --- Logging Configuration ---
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper() # [cite: 4]
+    LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true" # One JSON object per line instead of plain text
+    LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024)) # Rotate log files at this size
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5)) # Number of rotated log files to keep
+    LOG_FILE = os.getenv("LOG_FILE") # Optional log file for bridge.py (rotated like the email processor's)
 
     # --- Selenium Configuration ---
     SELENIUM_HEADLESS = os.getenv('HEADLESS', 'true').lower() == 'true'
+    # Write a verbose chromedriver.log (for debugging driver issues only; it grows quickly)
+    CHROMEDRIVER_VERBOSE = os.getenv('CHROMEDRIVER_VERBOSE', 'false').lower() == 'true'
+
+
+def warn_insecure_defaults(logger):
+    """Logs warnings for settings that must be changed in production. Called by the service entry points."""
+    if Config.SECRET_KEY == "your_insecure_development_secret_key":
+        logger.warning("Using default insecure FLASK_SECRET. Set FLASK_SECRET in production!") # [cite: 3, 4]
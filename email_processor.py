@@ -1,36 +1,27 @@
 import imaplib
 import email
 from email.header import decode_header
+from email.errors import HeaderParseError
 import time
 import redis
 from config import Config
+import idempotency
+from logging_setup import configure_logging, set_correlation_id
+from redis_pool import get_redis
 import logging
 import re # For parsing phone number from subject
 
-# Configure logging
-logging.basicConfig(
-    level=Config.LOG_LEVEL, # Use LOG_LEVEL from Config
-    format='%(asctime)s - %(levelname)s - %(message)s (email_processor)',
-    handlers=[
-        logging.FileHandler('email_processor.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# Redis connection
-try:
-    r = redis.Redis(
-        host=Config.REDIS_HOST,
-        port=Config.REDIS_PORT,
-        password=Config.REDIS_PASSWORD, # [cite: 3]
-        decode_responses=True
-    )
-    r.ping()
-    logger.info("Email Processor: Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    logger.error(f"Email Processor: Could not connect to Redis: {e}")
-    r = None 
+def check_redis():
+    """Returns True if Redis is reachable; the standalone service refuses to start otherwise."""
+    try:
+        get_redis().ping()
+        logger.info("Email Processor: Successfully connected to Redis.")
+        return True
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Email Processor: Could not connect to Redis: {e}")
+        return False
 
 def extract_phone_from_subject(subject_str, prefix):
     """
@@ -50,17 +41,33 @@ def extract_phone_from_subject(subject_str, prefix):
                 return phone_number
     return None
 
-def process_emails():
-    if not r:
-        logger.error("Email Processor: No Redis connection. Exiting.")
-        return
+def wait(seconds, should_stop):
+    """Sleeps for `seconds`, returning early once `should_stop()` is True."""
+    deadline = time.monotonic() + seconds
+    while not should_stop():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(remaining, 1))
+
+def process_emails(redis_conn=None, imap_factory=None, should_stop=None,
+                   poll_interval=30, batch_interval=10, reconnect_delay=60):
+    """
+    Polls the IMAP inbox for unseen emails and queues them for WhatsApp sending.
+    Runs until `should_stop()` returns True (forever by default). The optional
+    arguments let soak_email_processor.py run this loop against a local IMAP
+    stand-in and Redis with short intervals.
+    """
+    redis_conn = redis_conn or get_redis()
+    imap_factory = imap_factory or imaplib.IMAP4_SSL
+    should_stop = should_stop or (lambda: False)
 
     logger.info(f"Starting email processor for {Config.IMAP_USER}")
     
-    while True:
+    while not should_stop():
         try:
             logger.info(f"Connecting to IMAP server {Config.IMAP_SERVER}...")
-            mail = imaplib.IMAP4_SSL(Config.IMAP_SERVER, port=993) # [cite: 7] (assuming SSL, standard port)
+            mail = imap_factory(Config.IMAP_SERVER, port=993) # [cite: 7] (assuming SSL, standard port)
             
             logger.info(f"Logging in as {Config.IMAP_USER}...")
             mail.login(Config.IMAP_USER, Config.IMAP_PASSWORD)
@@ -69,7 +76,7 @@ def process_emails():
             mail.select("inbox") # [cite: 7]
             logger.info("INBOX selected. Waiting for new emails...")
 
-            while True: # Keep checking for emails
+            while not should_stop(): # Keep checking for emails
                 # Search for all unseen emails
                 status, messages = mail.search(None, 'UNSEEN') # [cite: 7]
                 if status != 'OK':
@@ -77,7 +84,7 @@ def process_emails():
                     break # Break inner loop to reconnect
 
                 if not messages[0]: # No unseen messages
-                    time.sleep(30) # Wait before checking again
+                    wait(poll_interval, should_stop) # Wait before checking again
                     # Periodically send NOOP to keep connection alive
                     if mail.noop()[0] != 'OK':
                         logger.warning("IMAP NOOP failed. Connection may be stale.")
@@ -87,6 +94,7 @@ def process_emails():
                 logger.info(f"Found {len(messages[0].split())} unseen email(s).")
 
                 for num in messages[0].split():
+                    set_correlation_id(None)
                     try:
                         status, data = mail.fetch(num, '(RFC822)') # [cite: 7]
                         if status != 'OK':
@@ -98,13 +106,18 @@ def process_emails():
                         subject_header = msg["Subject"]
                         subject = ""
                         if subject_header:
-                            decoded_subject_parts = decode_header(subject_header) # [cite: 8]
-                            for part, charset in decoded_subject_parts:
-                                if isinstance(part, bytes):
-                                    subject += part.decode(charset or 'utf-8', errors='ignore')
-                                else:
-                                    subject += part
-                        logger.info(f"Processing email with Subject: {subject}")
+                            try:
+                                decoded_subject_parts = decode_header(subject_header) # [cite: 8]
+                                for part, charset in decoded_subject_parts:
+                                    if isinstance(part, bytes):
+                                        subject += part.decode(charset or 'utf-8', errors='ignore')
+                                    else:
+                                        subject += part
+                            except (HeaderParseError, LookupError) as e:
+                                # Use the raw header so a garbled subject is marked seen instead of retried forever
+                                logger.warning(f"Could not decode subject header '{subject_header}': {e}")
+                                subject = str(subject_header)
+                        logger.debug("Processing email with Subject: %s", subject)
 
                         # Extract phone number using the prefix from config
                         phone_to_reply = extract_phone_from_subject(subject, Config.IMAP_REPLY_SUBJECT_PREFIX)
@@ -135,7 +148,7 @@ def process_emails():
                                         except: continue
                         else: # Not multipart
                             try:
-                                body = msg.get_payload(decode=True).decode(msg.get_content_charset() or 'utf-config_enctf-8', errors='ignore') # [cite: 8]
+                                body = msg.get_payload(decode=True).decode(msg.get_content_charset() or 'utf-8', errors='ignore') # [cite: 8]
                             except Exception as e:
                                 logger.error(f"Error decoding body for non-multipart: {e}")
                         
@@ -146,39 +159,50 @@ def process_emails():
                             mail.store(num, '+FLAGS', '\\Seen')
                             continue
                         
-                        # Queue for WhatsApp sending
+                        set_correlation_id(idempotency.content_hash(phone_to_reply, body)[:12])
+
+                        # Queue for WhatsApp sending, skipping mails already queued (e.g. re-fetched after
+                        # a reconnect) or identical replies. Dedup keys are only claimed together with the push.
                         payload = f"{phone_to_reply}||{body}"
-                        r.rpush(Config.REDIS_WHATSAPP_QUEUE, payload)
-                        logger.info(f"Queued WhatsApp reply to {phone_to_reply} from email (Subject: {subject})")
+                        email_key = idempotency.client_key("email", msg["Message-ID"])
+                        dedup_keys = idempotency.message_keys(phone_to_reply, body, email_key)
+                        if idempotency.enqueue_once(redis_conn, Config.REDIS_WHATSAPP_QUEUE, payload, dedup_keys) is None:
+                            logger.info("Duplicate email for %s ignored (Subject: %s). Marking as seen.", phone_to_reply, subject)
+                            mail.store(num, '+FLAGS', '\\Seen')
+                            continue
+                        logger.info("Queued WhatsApp reply to %s from email (Subject: %s)", phone_to_reply, subject)
                         
                         # Mark email as read (Seen)
                         mail.store(num, '+FLAGS', '\\Seen') # [cite: 8]
-                        logger.info(f"Marked email UID {num.decode()} as seen.")
+                        logger.debug("Marked email UID %s as seen.", num.decode())
 
+                    except imaplib.IMAP4.abort:
+                        raise # Connection is gone, reconnect instead of failing every remaining email
                     except Exception as e:
                         logger.error(f"Error processing email UID {num.decode() if isinstance(num, bytes) else num}: {e}", exc_info=True)
                         # Decide if you want to mark as seen on error or retry later
                         # mail.store(num, '+FLAGS', '\\Seen') 
                         continue # Process next email
                 
+                set_correlation_id(None)
                 # Check for shutdown flag if implemented, or just loop
-                time.sleep(10) # Wait before scanning for new messages again after processing a batch
+                wait(batch_interval, should_stop) # Wait before scanning for new messages again after processing a batch
 
         except imaplib.IMAP4.abort as e: # Specific error for IMAP abort like connection closed by server
-            logger.error(f"IMAP connection aborted: {e}. Reconnecting in 60s...")
-            time.sleep(60)
+            logger.error(f"IMAP connection aborted: {e}. Reconnecting in {reconnect_delay}s...")
+            wait(reconnect_delay, should_stop)
         except imaplib.IMAP4.error as e: # Other IMAP errors
-            logger.error(f"IMAP error: {e}. Reconnecting in 60s...")
-            time.sleep(60)
+            logger.error(f"IMAP error: {e}. Reconnecting in {reconnect_delay}s...")
+            wait(reconnect_delay, should_stop)
         except Exception as e:
             logger.error(f"General error in email processing loop: {e}", exc_info=True)
-            logger.info("Attempting to logout and reconnect in 60 seconds...")
+            logger.info(f"Attempting to logout and reconnect in {reconnect_delay} seconds...")
             try:
                 if 'mail' in locals() and mail.state != 'LOGOUT':
                     mail.logout()
             except:
                 pass
-            time.sleep(60) # Wait before retrying connection
+            wait(reconnect_delay, should_stop) # Wait before retrying connection
         finally:
             try:
                 if 'mail' in locals() and mail.state != 'LOGOUT':
@@ -190,7 +214,9 @@ def process_emails():
 
 
 if __name__ == '__main__':
-    if r is None:
+    # Configure logging (writes happen on a background thread, log file is rotated by size)
+    configure_logging('email_processor', log_file='email_processor.log')
+    if not check_redis():
         logger.error("Email Processor: Cannot start without Redis connection.")
     else:
         process_emails()
\ No newline at end of file
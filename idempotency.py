@@ -0,0 +1,111 @@
+import hashlib
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__) # Will inherit config from the script that imports this
+
+def content_hash(phone, message):
+    """Stable hash of a queued message (recipient + body)."""
+    return hashlib.sha256(f"{phone}||{message}".encode('utf-8')).hexdigest()
+
+def _redis_key(key):
+    return f"{Config.REDIS_DEDUP_PREFIX}:{key}"
+
+def claim(redis_conn, key, window=None):
+    """
+    Atomically claims `key` for the duplicate-suppression window using
+    SET NX EX. Returns True if this is the first time the key was seen
+    within the window, False if it is a duplicate.
+    """
+    window = window or Config.DEDUP_WINDOW_SECONDS
+    return bool(redis_conn.set(_redis_key(key), 1, nx=True, ex=window))
+
+def release(redis_conn, *keys):
+    """Releases claimed keys so the same message can be accepted again (e.g. after a failure)."""
+    if keys:
+        redis_conn.delete(*[_redis_key(key) for key in keys])
+
+def release_enqueue_claims(redis_conn):
+    """
+    Releases every claim taken when a message was queued (content hashes and
+    client keys), for use after the queue itself was emptied. Client keys
+    cannot be traced back to a payload, so all of them are released. 'sent'
+    claims are kept, so a message that was already delivered is not sent twice.
+    Returns the number of claims released.
+    """
+    released = 0
+    for prefix in ("content", "key"):
+        batch = []
+        for redis_key in redis_conn.scan_iter(match=_redis_key(f"{prefix}:*"), count=500):
+            batch.append(redis_key)
+            if len(batch) >= 500:
+                released += redis_conn.delete(*batch)
+                batch = []
+        if batch:
+            released += redis_conn.delete(*batch)
+    return released
+
+def client_key(source, value, scope=None):
+    """
+    Dedup key for a client-supplied identifier (an Idempotency-Key header or
+    an email Message-ID). Each source has its own namespace and web keys are
+    scoped to the sender, so one client cannot suppress another's messages.
+    The value is hashed, so arbitrary client text never ends up in a Redis key.
+    Returns None if there is no identifier.
+    """
+    if not value:
+        return None
+    digest = hashlib.sha256(str(value).encode('utf-8')).hexdigest() # str(): a Message-ID may be an email.header.Header
+    if scope:
+        return f"key:{source}:{scope}:{digest}"
+    return f"key:{source}:{digest}"
+
+def message_keys(phone, message, client_key=None):
+    """
+    Dedup keys for an incoming message: its optional client key (see
+    client_key()) and its content hash.
+    """
+    keys = []
+    if client_key:
+        keys.append(client_key)
+    keys.append(f"content:{content_hash(phone, message)}")
+    return keys
+
+def is_duplicate(redis_conn, keys):
+    """
+    True if any of `keys` is already claimed. Does not claim anything; used to
+    drop duplicates early, before they use up a rate-limit slot.
+    """
+    return redis_conn.exists(*[_redis_key(key) for key in keys]) > 0
+
+# KEYS[1] = queue, KEYS[2..] = dedup keys; ARGV[1] = payload, ARGV[2] = window in seconds
+ENQUEUE_ONCE_SCRIPT = """
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        return 0
+    end
+end
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], 1, 'EX', ARGV[2])
+end
+return redis.call('RPUSH', KEYS[1], ARGV[1])
+"""
+
+def enqueue_once(redis_conn, queue, payload, keys, window=None):
+    """
+    Pushes `payload` onto `queue` unless any of `keys` was claimed within the
+    duplicate-suppression window. The claims and the push run in one Lua
+    script, so a claim never exists without its message having been queued.
+    Returns the new queue length, or None if the message is a duplicate.
+    """
+    window = window or Config.DEDUP_WINDOW_SECONDS
+    redis_keys = [_redis_key(key) for key in keys]
+    queue_length = redis_conn.eval(ENQUEUE_ONCE_SCRIPT, 1 + len(redis_keys), queue, *redis_keys, payload, window)
+    return queue_length or None
+
+def requeue(redis_conn, queue, payload, *keys):
+    """Releases `keys` and pushes `payload` back onto `queue` in one MULTI/EXEC transaction."""
+    pipe = redis_conn.pipeline(transaction=True)
+    pipe.delete(*[_redis_key(key) for key in keys])
+    pipe.rpush(queue, payload)
+    pipe.execute()
@@ -0,0 +1,100 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from config import Config
+
+# Correlation ID of the message currently being handled, attached to every log record
+_correlation_id = contextvars.ContextVar('correlation_id', default='-')
+_listener = None
+
+def set_correlation_id(value):
+    """Tags subsequent log records from this thread/context with `value` (None clears it)."""
+    _correlation_id.set(value or '-')
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record):
+        record.correlation_id = _correlation_id.get()
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback separate from the message.
+    The stock prepare() merges it into `msg` and clears exc_info, so
+    formatters on the listener side could never tell the two apart.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks are not picklable and may be gone by the time the listener runs
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+    def __init__(self, service_name):
+        super().__init__()
+        self.service_name = service_name
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "service": self.service_name,
+            "correlation_id": getattr(record, 'correlation_id', '-'),
+            "message": record.getMessage(),
+        }
+        if record.exc_text: # Set by _QueueHandler.prepare
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+def configure_logging(service_name, log_file=None):
+    """
+    Configures the root logger for one of the bridge services.
+    Records are put on an in-memory queue by the calling thread and written to
+    the console (and `log_file`, rotated by size) by a background QueueListener,
+    so disk I/O never blocks the message path.
+    """
+    global _listener
+    if _listener: # Already configured in this process
+        return
+
+    if Config.LOG_JSON:
+        formatter = JsonFormatter(service_name)
+    else:
+        formatter = logging.Formatter(
+            f'%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s ({service_name})'
+        )
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=Config.LOG_FILE_MAX_BYTES,
+            backupCount=Config.LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = _QueueHandler(log_queue)
+    # Must run on the producing thread, where the correlation ID is set
+    queue_handler.addFilter(CorrelationIdFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(Config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop) # Flush queued records on exit
@@ -1,20 +1,20 @@
 import time
 import redis
-from whatsapp_sender import WhatsAppSender
 from config import Config
+from admission import DrainRateTracker
+import idempotency
+from logging_setup import configure_logging, set_correlation_id
+from redis_pool import get_redis
 import logging
 import signal
 
-# Configure logging
-logging.basicConfig(
-    level=Config.LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s (queue_processor)'
-)
 logger = logging.getLogger(__name__)
 
 # Global flag for graceful shutdown and current sender instance
 shutdown_flag = False
 current_whatsapp_sender = None 
+# Measured send throughput, published to Redis for app.py's admission control
+drain_tracker = DrainRateTracker()
 
 def signal_handler(sig, frame):
     global shutdown_flag
@@ -23,43 +23,23 @@ def signal_handler(sig, frame):
 
 class RedisManager:
     def __init__(self):
-        self.connection = None
-        self.connect()
+        # Client on the process-wide pool; dropped connections are re-opened on the next command
+        self.connection = get_redis()
 
-    def connect(self):
-        try:
-            self.connection = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                password=Config.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_timeout=10, 
-                socket_connect_timeout=5 
-            )
-            self.connection.ping()
-            logger.info("RedisManager: Successfully connected to Redis.")
-        except redis.exceptions.ConnectionError as e:
-            logger.error(f"RedisManager: Could not connect to Redis: {e}")
-            self.connection = None
-    
     def get_connection(self):
-        if not self.is_connected():
-            self.connect()
         return self.connection
 
     def is_connected(self):
-        if not self.connection:
-            return False
         try:
             self.connection.ping()
             return True
-        except redis.exceptions.ConnectionError:
+        except redis.exceptions.RedisError: # Includes TimeoutError from the pool's socket_timeout
             logger.warning("RedisManager: Ping failed. Connection lost.")
-            self.connection = None
             return False
 
 def initialize_whatsapp_instance(max_retries=3, retry_delay=10):
     global current_whatsapp_sender
+    from whatsapp_sender import WhatsAppSender # Selenium is only loaded once a sender is actually needed
     
     if current_whatsapp_sender and current_whatsapp_sender.driver:
         logger.info("Closing existing WhatsApp sender before (re)initializing.")
@@ -112,6 +92,7 @@ def process_queue(redis_conn):
             logger.info("Shutdown signal received during queue wait.")
             return True 
         
+        set_correlation_id(None)
         if not item:
             return True # Queue empty, no error, continue main loop
 
@@ -123,13 +104,25 @@ def process_queue(redis_conn):
             logger.error(f"Invalid queue item format: {payload}. Discarding.")
             return True 
         
-        logger.info(f"Processing message from queue for {phone}")
+        # Last line of defence against duplicates that made it into the queue
+        message_hash = idempotency.content_hash(phone, message)
+        set_correlation_id(message_hash[:12])
+        sent_key = f"sent:{message_hash}"
+        if not idempotency.claim(redis_conn, sent_key):
+            logger.info("Duplicate message for %s already sent recently. Discarding.", phone)
+            return True
+
+        logger.debug("Processing message from queue for %s", phone)
         
+        send_started = time.monotonic()
         if sender_to_use.send_message(phone, message):
-            logger.info(f"Message sent to {phone} successfully.")
+            logger.info("Message sent to %s successfully.", phone)
+            drain_tracker.record(time.monotonic() - send_started)
+            drain_tracker.publish(redis_conn)
         else:
-            logger.warning(f"Failed to send message to {phone}. Requeuing.")
-            redis_conn.rpush(Config.REDIS_WHATSAPP_QUEUE, payload)
+            logger.warning("Failed to send message to %s. Requeuing.", phone)
+            # Release the 'sent' claim together with the requeue, so the retry is not discarded as a duplicate
+            idempotency.requeue(redis_conn, Config.REDIS_WHATSAPP_QUEUE, payload, sent_key)
             
             logger.info("Attempting to re-initialize WhatsApp sender due to send failure.")
             if not initialize_whatsapp_instance(max_retries=1):
@@ -147,28 +140,40 @@ def process_queue(redis_conn):
 
     return True
 
-def main():
+def is_ready():
+    """True once a WhatsApp sender is logged in and able to send."""
+    return bool(current_whatsapp_sender and current_whatsapp_sender.driver)
+
+def clear_queue(redis_manager):
+    """
+    Empties the queue for a clean slate during development/debugging
+    (CLEAR_QUEUE_ON_STARTUP). The dedup claims of the dropped messages are
+    released too, so they can be submitted again.
+    """
+    if not redis_manager.is_connected():
+        logger.warning("Redis not connected on startup, could not clear queue.")
+        return
+    queue_name = Config.REDIS_WHATSAPP_QUEUE
+    redis_conn = redis_manager.get_connection()
+    length = redis_conn.llen(queue_name)
+    redis_conn.delete(queue_name)
+    released = idempotency.release_enqueue_claims(redis_conn)
+    logger.info(f"Cleared {length} old messages from Redis queue '{queue_name}' on startup "
+                f"and released {released} dedup claims.")
+
+def run_worker(clear_on_startup=Config.CLEAR_QUEUE_ON_STARTUP):
+    """
+    Runs the queue worker loop until `shutdown_flag` is set. Used directly by
+    bridge.py, which runs it in a thread and handles signals itself.
+    """
     global current_whatsapp_sender
     global shutdown_flag
 
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
     logger.info("Starting WhatsApp Queue Processor")
     
     redis_manager = RedisManager()
-    
-    # --- ADDITION START ---
-    # Clear the queue on startup for a clean slate during development/debugging
-    # IMPORTANT: For production, you might want to remove or make this conditional
-    # to avoid losing messages if the worker restarts unexpectedly.
-    if redis_manager.is_connected():
-        queue_name = Config.REDIS_WHATSAPP_QUEUE
-        deleted_count = redis_manager.get_connection().delete(queue_name)
-        logger.info(f"Cleared {deleted_count} old messages from Redis queue '{queue_name}' on startup.")
-    else:
-        logger.warning("Redis not connected on startup, could not clear queue.")
-    # --- ADDITION END ---
+    if clear_on_startup:
+        clear_queue(redis_manager)
 
     while not shutdown_flag:
         if not redis_manager.is_connected():
@@ -200,6 +205,12 @@ def main():
         
     logger.info("Queue Processor service stopped gracefully.")
 
+def main():
+    configure_logging('queue_processor')
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    run_worker()
+
 if __name__ == '__main__':
     main()
 
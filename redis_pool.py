@@ -0,0 +1,26 @@
+import threading
+import redis
+from config import Config
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_redis():
+    """
+    Returns a Redis client backed by a single connection pool shared by every
+    component in the process. The pool is created on first use and connects
+    lazily, so importing a module never opens a connection.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = redis.ConnectionPool(
+                    host=Config.REDIS_HOST,
+                    port=Config.REDIS_PORT,
+                    password=Config.REDIS_PASSWORD, # [cite: 3]
+                    decode_responses=True,
+                    socket_timeout=10, # Must stay above the worker's BLPOP timeout
+                    socket_connect_timeout=5
+                )
+    return redis.Redis(connection_pool=_pool)
@@ -0,0 +1,337 @@
+"""
+Offline soak test and benchmark for email_processor.py.
+
+Runs process_emails() against an in-process IMAP stand-in and a fake (or
+local) Redis, injecting dropped connections, IMAP4.abort, slow responses and
+Redis errors, then reports ingestion throughput, duplicate and loss counts and
+how long the processor takes to recover after each fault.
+
+    python soak_email_processor.py                      # 10k backlogged emails, default faults
+    python soak_email_processor.py --emails 500 --abort-rate 0.05 --redis-fault-rate 0.05
+    python soak_email_processor.py --redis              # use the Redis server from config.py
+
+Exits with a non-zero status if any valid email was lost or queued twice, or
+if a malformed email made it into the queue.
+"""
+import argparse
+import imaplib
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import redis
+from config import Config
+import email_processor
+import idempotency
+
+class FakeRedis:
+    """
+    In-memory stand-in for the few Redis commands the email processor uses.
+    With `fault_rate`, enqueues raise ConnectionError either before running or
+    after running with the reply lost, as a dropped connection would.
+    """
+    def __init__(self, fault_rate=0.0, seed=None):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.lists = {}
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.faults = 0
+
+    def ping(self):
+        return True
+
+    def set(self, key, value, nx=False, ex=None):
+        with self.lock: # Expiry is ignored, a soak run is far shorter than the dedup window
+            if nx and key in self.values:
+                return None
+            self.values[key] = value
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(1 for key in keys if self.values.pop(key, None) is not None)
+
+    def rpush(self, key, *values):
+        with self.lock:
+            self.lists.setdefault(key, []).extend(values)
+            return len(self.lists[key])
+
+    def exists(self, *keys):
+        with self.lock:
+            return sum(1 for key in keys if key in self.values)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        """Only supports idempotency.ENQUEUE_ONCE_SCRIPT, applied atomically like the real script."""
+        if script != idempotency.ENQUEUE_ONCE_SCRIPT:
+            raise NotImplementedError("FakeRedis only supports the enqueue-once script")
+        queue, *dedup_keys = keys_and_args[:numkeys]
+        payload = keys_and_args[numkeys]
+        fault = self.random.random() < self.fault_rate
+        if fault and self.random.random() < 0.5:
+            self.faults += 1
+            raise redis.exceptions.ConnectionError("Connection reset before reply (injected)")
+        with self.lock:
+            if any(key in self.values for key in dedup_keys):
+                result = 0
+            else:
+                for key in dedup_keys:
+                    self.values[key] = 1
+                self.lists.setdefault(queue, []).append(payload)
+                result = len(self.lists[queue])
+        if fault:
+            self.faults += 1
+            raise redis.exceptions.ConnectionError("Connection reset after command (injected)")
+        return result
+
+    def llen(self, key):
+        with self.lock:
+            return len(self.lists.get(key, []))
+
+    def lrange(self, key, start, end):
+        with self.lock:
+            items = self.lists.get(key, [])
+            return items[start:] if end == -1 else items[start:end + 1]
+
+class FakeMailServer:
+    """
+    Holds the mailbox shared by all connections and decides when to inject faults.
+    Every injected fault is timestamped; the next successful SELECT marks recovery.
+    """
+    def __init__(self, raw_messages, abort_rate=0.0, disconnect_rate=0.0,
+                 slow_rate=0.0, slow_latency=0.2, seed=None):
+        self.messages = {str(i + 1).encode(): raw for i, raw in enumerate(raw_messages)}
+        self.seen = set()
+        self.lock = threading.Lock()
+        self.abort_rate = abort_rate
+        self.disconnect_rate = disconnect_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.faults = {"abort": 0, "disconnect": 0, "slow": 0}
+        self.connections = 0
+        self.pending_fault_at = None
+        self.recovery_times = []
+
+    def connect(self, host, port=993):
+        self.connections += 1
+        if self.random.random() < self.disconnect_rate:
+            self.record_fault("disconnect")
+            raise ConnectionResetError("Connection reset by peer (injected)")
+        return FakeIMAPConnection(self)
+
+    def record_fault(self, kind):
+        self.faults[kind] += 1
+        if kind != "slow" and self.pending_fault_at is None:
+            self.pending_fault_at = time.monotonic()
+
+    def record_recovery(self):
+        if self.pending_fault_at is not None:
+            self.recovery_times.append(time.monotonic() - self.pending_fault_at)
+            self.pending_fault_at = None
+
+    def unseen(self):
+        with self.lock:
+            return [num for num in self.messages if num not in self.seen]
+
+class FakeIMAPConnection:
+    """Implements the subset of imaplib.IMAP4 used by process_emails()."""
+    def __init__(self, server):
+        self.server = server
+        self.state = 'NONAUTH'
+        self.dead = False
+
+    def _command(self):
+        if self.dead:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+        roll = self.server.random.random()
+        if roll < self.server.abort_rate:
+            self.dead = True
+            self.server.record_fault("abort")
+            raise imaplib.IMAP4.abort("command: server closed connection (injected)")
+        if roll < self.server.abort_rate + self.server.slow_rate:
+            self.server.record_fault("slow")
+            time.sleep(self.server.slow_latency)
+
+    def login(self, user, password):
+        self._command()
+        self.state = 'AUTH'
+        return 'OK', [b'Logged in']
+
+    def select(self, mailbox='INBOX'):
+        self._command()
+        self.state = 'SELECTED'
+        self.server.record_recovery()
+        return 'OK', [str(len(self.server.messages)).encode()]
+
+    def search(self, charset, *criteria):
+        self._command()
+        return 'OK', [b' '.join(self.server.unseen())]
+
+    def fetch(self, num, message_parts):
+        self._command()
+        raw = self.server.messages.get(num)
+        if raw is None:
+            return 'NO', [None]
+        return 'OK', [(num + b' (RFC822 {' + str(len(raw)).encode() + b'}', raw), b')']
+
+    def store(self, num, command, flags):
+        self._command()
+        if command == '+FLAGS' and '\\Seen' in flags:
+            with self.server.lock:
+                self.server.seen.add(num)
+        return 'OK', [num + b' (FLAGS (\\Seen))']
+
+    def noop(self):
+        self._command()
+        return 'OK', [b'NOOP completed']
+
+    def close(self):
+        self._command()
+        self.state = 'AUTH'
+        return 'OK', [b'Closed']
+
+    def logout(self):
+        self.state = 'LOGOUT'
+        if self.dead:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+        return 'BYE', [b'Logging out']
+
+def build_corpus(count, malformed_rate, resend_rate, seed=None):
+    """
+    Builds `count` raw emails. Returns (raw_messages, expected_payloads, malformed_count)
+    where expected_payloads is the set of queue payloads the processor should produce.
+    A fraction of emails are malformed (must not be queued) and a fraction are resends
+    of earlier emails with a new Message-ID (must be suppressed as duplicates).
+    """
+    rng = random.Random(seed)
+    prefix = Config.IMAP_REPLY_SUBJECT_PREFIX
+    raw_messages = []
+    expected = set()
+    sent = []
+    malformed = 0
+    for i in range(count):
+        roll = rng.random()
+        if roll < malformed_rate:
+            malformed += 1
+            subject = rng.choice([
+                f"Re: hello {i}",                 # No prefix
+                f"{prefix} 0800 {i}",             # No international number
+                f"{prefix} +0{i:08d}",            # Invalid country code
+                f"{prefix} +12",                  # Too short
+                "=?utf-8?b?not base64?=",         # Garbled encoded header
+            ])
+            body = f"malformed body {i}"
+        elif roll < malformed_rate + resend_rate and sent:
+            subject, body = rng.choice(sent)
+        else:
+            phone = f"+27{rng.randint(600000000, 899999999)}"
+            subject = f"{prefix} {phone}"
+            body = f"Soak message {i} {uuid.uuid4().hex}"
+            sent.append((subject, body))
+            expected.add(f"{phone}||{body}")
+
+        if i % 2:
+            msg = MIMEMultipart()
+            msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        else:
+            msg = EmailMessage()
+            msg.set_content(body)
+        msg["Subject"] = subject
+        msg["From"] = "team@example.com"
+        msg["To"] = Config.IMAP_USER
+        msg["Message-ID"] = f"<soak-{i}-{uuid.uuid4().hex}@example.com>"
+        raw_messages.append(msg.as_bytes())
+    return raw_messages, expected, malformed
+
+def run(args):
+    logging.basicConfig(level=args.log_level.upper())
+
+    if args.redis:
+        redis_conn = redis.Redis(host=Config.REDIS_HOST, port=Config.REDIS_PORT,
+                                 password=Config.REDIS_PASSWORD, decode_responses=True)
+        redis_conn.ping()
+        # Keep soak data away from the real queue and dedup keys
+        key_prefix = f"soak:{uuid.uuid4().hex[:8]}"
+        Config.REDIS_WHATSAPP_QUEUE = f"{key_prefix}:whatsapp_queue"
+        Config.REDIS_DEDUP_PREFIX = f"{key_prefix}:dedup"
+    else:
+        redis_conn = FakeRedis(fault_rate=args.redis_fault_rate, seed=args.seed)
+
+    raw_messages, expected, malformed = build_corpus(args.emails, args.malformed_rate, args.resend_rate, args.seed)
+    server = FakeMailServer(raw_messages, abort_rate=args.abort_rate, disconnect_rate=args.disconnect_rate,
+                            slow_rate=args.slow_rate, slow_latency=args.slow_latency, seed=args.seed)
+    print(f"Soak run: {args.emails} emails, {'local' if args.redis else 'fake'} Redis...", flush=True)
+
+    stop = threading.Event()
+    worker = threading.Thread(
+        target=email_processor.process_emails,
+        kwargs=dict(redis_conn=redis_conn, imap_factory=server.connect, should_stop=stop.is_set,
+                    poll_interval=0.01, batch_interval=0.01, reconnect_delay=args.reconnect_delay),
+        daemon=True
+    )
+    started = time.monotonic()
+    worker.start()
+    while server.unseen() and time.monotonic() - started < args.timeout:
+        time.sleep(0.05)
+    elapsed = time.monotonic() - started
+    stop.set()
+    worker.join(timeout=5)
+
+    queued = redis_conn.lrange(Config.REDIS_WHATSAPP_QUEUE, 0, -1)
+    if args.redis:
+        for key in redis_conn.scan_iter(f"{key_prefix}:*"):
+            redis_conn.delete(key)
+
+    queued_set = set(queued)
+    duplicates = len(queued) - len(queued_set)
+    lost = len(expected - queued_set)
+    unexpected = len(queued_set - expected)
+    unseen = len(server.unseen())
+    recovery = server.recovery_times
+
+    print(f"Emails:               {args.emails} ({len(expected)} valid unique, {malformed} malformed)")
+    print(f"Elapsed:              {elapsed:.2f}s{' (TIMED OUT)' if unseen else ''}")
+    print(f"Throughput:           {len(queued) / elapsed:.1f} queued/s, {(args.emails - unseen) / elapsed:.1f} emails/s")
+    print(f"Queued:               {len(queued)}")
+    print(f"Duplicates:           {duplicates}")
+    print(f"Lost:                 {lost}")
+    print(f"Malformed queued:     {unexpected}")
+    print(f"Left unseen:          {unseen}")
+    print(f"Connections:          {server.connections}")
+    print(f"Faults injected:      {server.faults['abort']} abort, {server.faults['disconnect']} disconnect, "
+          f"{server.faults['slow']} slow, {getattr(redis_conn, 'faults', 0)} Redis")
+    if recovery:
+        print(f"Reconnect recovery:   mean {statistics.mean(recovery) * 1000:.1f}ms, "
+              f"max {max(recovery) * 1000:.1f}ms over {len(recovery)} recoveries")
+    else:
+        print("Reconnect recovery:   no faults recovered from")
+
+    return 0 if not (duplicates or lost or unexpected or unseen) else 1
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline soak test for email_processor.py")
+    parser.add_argument("--emails", type=int, default=10000, help="Number of backlogged emails")
+    parser.add_argument("--malformed-rate", type=float, default=0.05, help="Fraction of emails with unusable subjects")
+    parser.add_argument("--resend-rate", type=float, default=0.05, help="Fraction of emails resent with a new Message-ID")
+    parser.add_argument("--abort-rate", type=float, default=0.001, help="Chance an IMAP command raises IMAP4.abort")
+    parser.add_argument("--disconnect-rate", type=float, default=0.1, help="Chance a connection attempt is refused")
+    parser.add_argument("--slow-rate", type=float, default=0.001, help="Chance an IMAP command is slow")
+    parser.add_argument("--slow-latency", type=float, default=0.2, help="Seconds added to slow commands")
+    parser.add_argument("--reconnect-delay", type=float, default=0.05, help="Seconds process_emails waits before reconnecting")
+    parser.add_argument("--timeout", type=float, default=300, help="Give up after this many seconds")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible run")
+    parser.add_argument("--redis-fault-rate", type=float, default=0.01,
+                        help="Chance a fake Redis enqueue fails with ConnectionError (ignored with --redis)")
+    parser.add_argument("--redis", action="store_true", help="Use the Redis server from config.py instead of a fake")
+    parser.add_argument("--log-level", default="CRITICAL", help="Log level for email_processor output")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    sys.exit(run(parse_args()))
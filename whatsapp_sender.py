@@ -58,13 +58,18 @@ class WhatsAppSender:
             chromedriver_executable_path = "chromedriver" 
             logger.info(f"Attempting to use ChromeDriver from system PATH by specifying: '{chromedriver_executable_path}'")
 
-            log_file_path = os.path.join(os.getcwd(), "chromedriver.log")
-            logger.info(f"ChromeDriver verbose log will be at: {log_file_path}")
+            # Verbose driver logging is only for debugging; otherwise chromedriver output is discarded
+            service_args = []
+            log_file_path = None
+            if Config.CHROMEDRIVER_VERBOSE:
+                service_args = ['--verbose']
+                log_file_path = os.path.join(os.getcwd(), "chromedriver.log")
+                logger.info(f"ChromeDriver verbose log will be at: {log_file_path}")
             
             # Initialize the Service with the name "chromedriver"
             # Selenium will search for "chromedriver" in the directories listed in your system's PATH.
             service = Service(executable_path=chromedriver_executable_path,
-                              service_args=['--verbose'],
+                              service_args=service_args,
                               log_output=log_file_path) # For Selenium 4.6+ (recommended)
                                                         # For older versions, you might use log_path=log_file_path
 
@@ -148,7 +153,7 @@ class WhatsAppSender:
                 elapsed = current_time - self.window_start
                 if elapsed < 60:
                     sleep_duration = 60 - elapsed
-                    logger.info(f"Rate limit hit ({Config.RATE_LIMIT} messages/min). Sleeping for {sleep_duration:.2f} seconds.")
+                    logger.info("Rate limit hit (%s messages/min). Sleeping for %.2f seconds.", Config.RATE_LIMIT, sleep_duration)
                     time.sleep(sleep_duration)
                 self.message_count = 0
                 self.window_start = time.time() # Reset window after waiting or after 60s
@@ -156,7 +161,7 @@ class WhatsAppSender:
             encoded_message = urllib.parse.quote(message)
             # &app_absent=0 can sometimes help ensure it opens directly in WA Web
             url = f"https://web.whatsapp.com/send?phone={phone}&text={encoded_message}&app_absent=0" 
-            logger.info(f"Navigating to chat URL for {phone}")
+            logger.debug("Navigating to chat URL for %s", phone)
             self.driver.get(url)
             
             # Wait for the main message input box to ensure page is ready for send button
@@ -167,7 +172,7 @@ class WhatsAppSender:
                 WebDriverWait(self.driver, 30).until(
                     EC.presence_of_element_located((By.XPATH, message_box_xpath))
                 )
-                logger.info("Message input box found.")
+                logger.debug("Message input box found.")
             except TimeoutException:
                 logger.error(f"Timeout: Could not find message input box for {phone}. Number might be invalid or chat not opening.")
                 try: # Check for specific WhatsApp error message for invalid numbers
@@ -193,17 +198,17 @@ class WhatsAppSender:
                     send_btn = WebDriverWait(self.driver, timeout).until(
                         EC.element_to_be_clickable((By.XPATH, xpath))
                     )
-                    logger.info(f"Send button found with XPath: {xpath}")
+                    logger.debug("Send button found with XPath: %s", xpath)
                     break # Exit loop once button is found
                 except TimeoutException:
-                    logger.debug(f"Send button not found with XPath: {xpath}. Trying next...")
+                    logger.debug("Send button not found with XPath: %s. Trying next...", xpath)
             
             if not send_btn: # If button was not found after all attempts
                 logger.error(f"TimeoutException: Send button not found for {phone} after trying multiple XPaths.")
                 return False
 
             send_btn.click()
-            logger.info(f"Clicked send button for {phone}.")
+            logger.debug("Clicked send button for %s.", phone)
             
             self.message_count += 1
             time.sleep(2) # Brief pause to allow message to process/send